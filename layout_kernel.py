@@ -0,0 +1,182 @@
+""" Compiled geometry kernel for building board polygons
+The kernel works on plain floats and writes the board points into caller supplied buffers,
+so the whole layout is computed without Python objects in the inner loop.
+It runs as plain Python by default and is compiled with numba when TILTED_LAYOUT_NUMBA=1 is set.
+Compiling only pays off when many layouts are computed in one process.
+"""
+
+import math
+import os
+import numpy as np
+
+if os.environ.get("TILTED_LAYOUT_NUMBA") == "1":
+    from numba import njit
+else:
+    def njit(*args, **kwargs):
+        """ Default decorator leaving the kernel as plain Python"""
+        def decorator(func):
+            return func
+        return decorator
+
+# Each line can hit all 4 frame edges when it passes through corners, plus the 4 corners themselves
+MAX_BOARD_POINTS = 12
+
+@njit(cache=True)
+def _emit(out: np.ndarray, count: int, x: float, y: float) -> int:
+    out[count, 0] = x
+    out[count, 1] = y
+    return count + 1
+
+@njit(cache=True)
+def _emit_edge(out: np.ndarray, count: int, x1: float, y1: float, hit1: bool,
+               x2: float, y2: float, hit2: bool, second_first: bool) -> int:
+    """ Emit the intersections of both lines with one frame edge, the second line first if second_first is set"""
+    if hit1 and hit2 and second_first:
+        count = _emit(out, count, x2, y2)
+        return _emit(out, count, x1, y1)
+    if hit1:
+        count = _emit(out, count, x1, y1)
+    if hit2:
+        count = _emit(out, count, x2, y2)
+    return count
+
+@njit(cache=True)
+def _half_plane(dx: float, dy: float) -> int:
+    if dy < 0:
+        return 0
+    if dy == 0:
+        return 1 if dx >= 0 else 3
+    return 2
+
+@njit(cache=True)
+def _reverse(out: np.ndarray, start: int, stop: int) -> None:
+    """ Reverse the points out[start:stop] in place"""
+    i = start
+    j = stop - 1
+    while i < j:
+        (out[i, 0], out[j, 0]) = (out[j, 0], out[i, 0])
+        (out[i, 1], out[j, 1]) = (out[j, 1], out[i, 1])
+        i += 1
+        j -= 1
+
+@njit(cache=True)
+def _rotate_to_first_angle(out: np.ndarray, count: int, cx: float) -> None:
+    """ Rotate the points in place so they start with the smallest polar angle around (cx, 0)"""
+    first = 0
+    fx = out[0, 0] - cx
+    fy = out[0, 1]
+    fh = _half_plane(fx, fy)
+    for i in range(1, count):
+        dx = out[i, 0] - cx
+        dy = out[i, 1]
+        h = _half_plane(dx, dy)
+        # Within one half plane the point clockwise of the current first one has the smaller angle
+        if h < fh or (h == fh and fx * dy - fy * dx < 0):
+            first = i
+            fx = dx
+            fy = dy
+            fh = h
+    if first > 0:
+        _reverse(out, 0, first)
+        _reverse(out, first, count)
+        _reverse(out, 0, count)
+
+@njit(cache=True)
+def _snap(value: float, limit: float) -> float:
+    """ Snap a coordinate within rounding error of +-limit onto it, with the relative tolerance of math.isclose"""
+    if abs(abs(value) - limit) <= 1e-9 * limit:
+        return math.copysign(limit, value)
+    return value
+
+@njit(cache=True)
+def _snap_to_frame(out: np.ndarray, count: int, hw: float, hh: float) -> int:
+    """ Snap the points out[:count] onto the frame sides they round next to and drop the repeated points this
+    leaves where a board line passes through a frame corner. Returns the remaining point count"""
+    kept = 0
+    for i in range(count):
+        x = _snap(out[i, 0], hw)
+        y = _snap(out[i, 1], hh)
+        if kept > 0 and x == out[kept - 1, 0] and y == out[kept - 1, 1]:
+            continue
+        out[kept, 0] = x
+        out[kept, 1] = y
+        kept += 1
+    if kept > 1 and out[kept - 1, 0] == out[0, 0] and out[kept - 1, 1] == out[0, 1]:
+        kept -= 1
+    return kept
+
+@njit(cache=True)
+def build_board(offset: float, slope: float, slope_hw: float, bxhw: float, hw: float, hh: float, out: np.ndarray) -> int:
+    """ Build the board at the given offset inside the frame [-hw, hw] x [-hh, hh].
+    slope_hw is slope * hw, the rise of the board lines from the frame center to its sides.
+    bxhw must be signed so that line 1 at offset - bxhw lies above line 2 at offset + bxhw.
+    Writes the board points counterclockwise into out and returns their count, 0 if the board is out of frame"""
+    intercept1 = -slope * (offset - bxhw)
+    intercept2 = -slope * (offset + bxhw)
+
+    # Trivial rejection: a line crossing the frame center axis further than hh + |slope * hw| away misses the frame
+    reach = hh + abs(slope_hw)
+    if abs(intercept1) > reach and abs(intercept2) > reach:
+        return 0
+
+    # Intersections with the bottom, right, top and left frame edges
+    b1 = (-hh - intercept1) / slope
+    b2 = (-hh - intercept2) / slope
+    r1 = slope_hw + intercept1
+    r2 = slope_hw + intercept2
+    t1 = (hh - intercept1) / slope
+    t2 = (hh - intercept2) / slope
+    l1 = -slope_hw + intercept1
+    l2 = -slope_hw + intercept2
+    hit_b1 = -hw <= b1 <= hw
+    hit_b2 = -hw <= b2 <= hw
+    hit_r1 = -hh <= r1 <= hh
+    hit_r2 = -hh <= r2 <= hh
+    hit_t1 = -hw <= t1 <= hw
+    hit_t2 = -hw <= t2 <= hw
+    hit_l1 = -hh <= l1 <= hh
+    hit_l2 = -hh <= l2 <= hh
+    if not (hit_b1 or hit_b2 or hit_r1 or hit_r2 or hit_t1 or hit_t2 or hit_l1 or hit_l2):
+        return 0
+
+    # Walk the perimeter counterclockwise from the bottom left corner, corners between the lines are part of the board.
+    # Along each edge the points are emitted in walking direction: +x on the bottom, +y on the right, -x on the top, -y on the left
+    count = 0
+    if l2 <= -hh <= l1:
+        count = _emit(out, count, -hw, -hh)
+    count = _emit_edge(out, count, b1, -hh, hit_b1, b2, -hh, hit_b2, b2 < b1)
+    if r2 <= -hh <= r1:
+        count = _emit(out, count, hw, -hh)
+    count = _emit_edge(out, count, hw, r1, hit_r1, hw, r2, hit_r2, r2 < r1)
+    if r2 <= hh <= r1:
+        count = _emit(out, count, hw, hh)
+    count = _emit_edge(out, count, t1, hh, hit_t1, t2, hh, hit_t2, t2 > t1)
+    if l2 <= hh <= l1:
+        count = _emit(out, count, -hw, hh)
+    count = _emit_edge(out, count, -hw, l1, hit_l1, -hw, l2, hit_l2, l2 > l1)
+
+    count = _snap_to_frame(out, count, hw, hh)
+    _rotate_to_first_angle(out, count, offset)
+    return count
+
+@njit(cache=True)
+def build_boards(offset: float, step: float, count: int, slope: float, slope_hw: float, bxhw: float,
+                 hw: float, hh: float, boards: np.ndarray, lengths: np.ndarray) -> int:
+    """ Build the boards at offset + k * step and their mirrors at the negated offsets for k = 1..count,
+    stopping at the first pair out of frame. Writes the points of each board into boards[i] and their count
+    into lengths[i], returns the number of boards built"""
+    built = 0
+    for k in range(1, count + 1):
+        board_offset = offset + step * k
+        count1 = build_board(board_offset, slope, slope_hw, bxhw, hw, hh, boards[built])
+        if count1 == 0:
+            break
+
+        count2 = build_board(-board_offset, slope, slope_hw, bxhw, hw, hh, boards[built + 1])
+        if count2 == 0:
+            break
+
+        lengths[built] = count1
+        lengths[built + 1] = count2
+        built += 2
+    return built
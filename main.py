@@ -3,7 +3,8 @@ Used for generating cutting diagrams for woodworking projects.
 
 How it works: Two tilted lines for each board intersecting a rectangular frame define the edges of a board. 
 If the frame corners are between the two lines, they are also included in the board shape.
-The board points are then sorted in clockwise order around the board center to form a polygon.
+The board points are collected by walking the frame perimeter, so they come out already ordered around the polygon
+and only need to be rotated to start at the smallest angle around the board center.
 """
 
 from excaligen.DiagramBuilder import DiagramBuilder
@@ -11,53 +12,13 @@ from abc import ABC, abstractmethod
 from typing import Self
 
 import math
+import numpy as np
+
+from layout_kernel import build_board, build_boards, MAX_BOARD_POINTS
 
 Point = tuple[float, float]
-Board = list[Point]
-
-Frame = tuple[Point, Point, Point, Point]
-
-class TiltedLine:
-    """ Represents a line tilted at a certain angle and offset from the origin"""
-    def __init__(self, angle: float, offset: float):
-        self.angle = angle
-        self.slope = math.tan(angle)
-        self.intercept = -self.slope * offset
-
-    def intersect_frame(self, frame: Frame) -> list[Point] | None:
-        for i in range(4):
-            p1 = frame[i]
-            p2 = frame[(i + 1) % 4]
-            intersection = self.intersect_aa_line(p1, p2)
-            if intersection is not None:
-                yield intersection
-
-    def is_point_between_lines(self, point: Point, other: "TiltedLine") -> bool:
-        (x, y) = point
-        y1 = self.slope * x + self.intercept
-        y2 = other.slope * x + other.intercept
-        return y >= min(y1, y2) and y <= max(y1, y2)
-
-    def intersect_aa_line(self, p1: Point, p2: Point) -> Point | None:
-        (x1, y1) = p1
-        (x2, y2) = p2
-        if math.isclose(x1, x2):
-            x = x1
-            y = self.slope * x + self.intercept
-            if y >= min(y1, y2) and y <= max(y1, y2):
-                return (x, y)
-            else:
-                return None
-        elif math.isclose(y1, y2):
-            y = y1
-            x = (y - self.intercept) / self.slope
-            if x >= min(x1, x2) and x <= max(x1, x2):
-                return (x, y)
-            else:
-                return None
-        
-        else:
-            raise ValueError("Non axis-aligned line segment is not supported")
+Board = np.ndarray # (k, 2) array of board points
+
 
 class Layout(ABC):
     """ Calculates the layout of boards in a tilted frame"""
@@ -65,30 +26,43 @@ class Layout(ABC):
         self.angle = math.radians(angle)
         self.width = width
         self.height = height
-        self.frame = ((-width / 2, -height / 2), (width / 2, -height / 2), (width / 2, height / 2), (-width / 2, height / 2))
-        self.offset_step = board_width / math.sin(self.angle) + spacing / math.sin(self.angle)
-        self.board_x_half_width = board_width / math.sin(self.angle) / 2
+        sin_angle = math.sin(self.angle)
+        self.offset_step = (board_width + spacing) / sin_angle
+        self.board_x_half_width = board_width / sin_angle / 2
+        self._slope = math.tan(self.angle)
+        # Signed so that the board line at offset - half width always lies above the one at offset + half width
+        self._band_half_width = math.copysign(self.board_x_half_width, self._slope)
+        # The kernel snaps board points on a frame edge to this exact coordinate, so they are matched with == rather than isclose
+        self._hw, self._hh = width / 2, height / 2
+        self._slope_hw = self._slope * self._hw
+        self._board_buffer = np.empty((MAX_BOARD_POINTS, 2))
         self.boards: list[Board] = []
-        self.top_offsets: list[(float, float)] = []
-        self.bottom_offsets: list[(float, float)] = []
-        self.left_offsets: list[(float, float)] = []
-        self.right_offsets: list[(float, float)] = []
+        self.board_array = np.empty((0, MAX_BOARD_POINTS, 2))
+        self.board_lengths = np.empty(0, dtype=np.intp)
+        self.top_offsets = np.empty((0, 2))
+        self.bottom_offsets = np.empty((0, 2))
+        self.left_offsets = np.empty((0, 2))
+        self.right_offsets = np.empty((0, 2))
 
     def calculate(self) -> Self:
         """ Calculate the layout of boards in the frame"""
         offset = self.setup()
-        while True:
-            offset += self.offset_step
-            board = self._try_create_board(offset)
-            if board is None:
-                break
-            
-            board2 = self._try_create_board(-offset)
-            if board2 is None:
-                break
-
-            self.boards.append(board)
-            self.boards.append(board2)
+        # Lines further than this from the origin along the x axis cannot reach the frame
+        reach = self._hw + self._hh / abs(self._slope) + abs(self.board_x_half_width)
+        count = int((reach + abs(offset)) / abs(self.offset_step)) + 1
+        # Boards created by setup come first, the kernel appends the remaining ones
+        start = len(self.boards)
+        boards = np.zeros((start + 2 * count, MAX_BOARD_POINTS, 2))
+        lengths = np.zeros(start + 2 * count, dtype=np.intp)
+        for (i, board) in enumerate(self.boards):
+            boards[i, :len(board)] = board
+            lengths[i] = len(board)
+
+        built = build_boards(offset, self.offset_step, count, self._slope, self._slope_hw, self._band_half_width,
+                             self._hw, self._hh, boards[start:], lengths[start:])
+        self.board_array = boards[:start + built]
+        self.board_lengths = lengths[:start + built]
+        self.boards = [board[:n] for (board, n) in zip(self.board_array, self.board_lengths.tolist())]
 
         self._calculate_offsets()
         return self
@@ -99,51 +73,23 @@ class Layout(ABC):
 
     def _try_create_board(self, offset) -> Board | None:
         """ Try to create a board at a given offset. Returns None if the board is out of frame"""
-        center = (offset, 0)
-        xmin = offset - self.board_x_half_width
-        xmax = offset + self.board_x_half_width
-        line1 = TiltedLine(self.angle, xmin)
-        line2 = TiltedLine(self.angle, xmax)
-        intersections1 = list(line1.intersect_frame(self.frame))
-        intersections2 = list(line2.intersect_frame(self.frame))
-        if len(intersections1) == 0 and len(intersections2) == 0:
+        count = build_board(offset, self._slope, self._slope_hw, self._band_half_width, self._hw, self._hh, self._board_buffer)
+        if count == 0:
             return None
-
-        board = []
-
-        for corner in self.frame:
-            if line1.is_point_between_lines(corner, line2):
-                board.append(corner)
-
-        board.extend(intersections1)
-        board.extend(intersections2)
-        board = self._sort_board_points(board, center)
-
-        return board
-
-    def _sort_board_points(self, board: Board, center: Point) -> Board:
-        """ Sort board points in clockwise order around the center point"""
-        (cx, cy) = center
-        def angle_from_center(point: Point) -> float:
-            (x, y) = point
-            return math.atan2(y - cy, x - cx)
-        return sorted(board, key = angle_from_center)
+        return self._board_buffer[:count].copy()
 
     def _calculate_offsets(self):
         """ Calculate offsets of borads touching the frame edges"""
-        for board in self.boards:
-            for (x, y) in board:
-                if math.isclose(y, -self.height / 2):
-                    self._append_offset(self.bottom_offsets, x, self.width / 2)
-                if math.isclose(y, self.height / 2):
-                    self._append_offset(self.top_offsets, x, self.width / 2)
-                if math.isclose(x, -self.width / 2):
-                    self._append_offset(self.left_offsets, y, self.height / 2)
-                if math.isclose(x, self.width / 2):
-                    self._append_offset(self.right_offsets, y, self.height / 2)
-
-    def _append_offset(self, offsets: list[(float, float)], value: float, shift: float):
-        offsets.append((value, value + shift))
+        points = self.board_array[np.arange(MAX_BOARD_POINTS) < self.board_lengths[:, np.newaxis]]
+        xs = points[:, 0]
+        ys = points[:, 1]
+        self.bottom_offsets = self._edge_offsets(xs[ys == -self._hh], self._hw)
+        self.top_offsets = self._edge_offsets(xs[ys == self._hh], self._hw)
+        self.left_offsets = self._edge_offsets(ys[xs == -self._hw], self._hh)
+        self.right_offsets = self._edge_offsets(ys[xs == self._hw], self._hh)
+
+    def _edge_offsets(self, values: np.ndarray, shift: float) -> np.ndarray:
+        return np.column_stack((values, values + shift))
 
 class EvenLayout(Layout):
     """ Layout with even number of boards"""
@@ -160,15 +106,14 @@ class Renderer:
     """ Renders the layout using Excalidraw"""
     def __init__(self, layout: Layout) -> None:
         self.layout = layout
+        self._transformed_boards = self._transform_boards()
 
     def render(self, basename: str):
         """ Render the layout to an Excalidraw file"""
         xd = DiagramBuilder()
-        xd.defaults().sloppiness('architect').roundness('sharp').thickness('thin').color("black")
-        for board in self.layout.boards:
-            transformed_board = [(x, -y) for (x, y) in board] # Invert Y axis for Excalidraw
-
-            xd.line().points(transformed_board).close().background('brown').fill('solid')
+        xd.defaults().sloppiness('architect').roundness('sharp').thickness('thin').color("black").background('brown').fill('solid')
+        for transformed_board in self._transformed_boards:
+            xd.line().points(self._points(transformed_board)).close()
 
         xd.save(self._create_filename(basename))
 
@@ -176,72 +121,93 @@ class Renderer:
         """ Render the layout as a blueprint to an Excalidraw file"""
         xd = DiagramBuilder()
         xd.defaults().sloppiness('architect').roundness('sharp').thickness('thin').color("black").font('Nunito')
-        for board in self.layout.boards:
-            transformed_board = [(x, -y) for (x, y) in board] # Invert Y axis for Excalidraw
-            xd.line().points(transformed_board).close()
+        for transformed_board in self._transformed_boards:
+            xd.line().points(self._points(transformed_board)).close()
             self._render_board_dimensions(xd, transformed_board)
 
         self._render_border_offsets(xd)
 
         xd.save(self._create_filename(basename))
 
+    def _transform_boards(self) -> list[Board]:
+        """ Convert the boards to Excalidraw coordinates"""
+        boards = self.layout.board_array.copy()
+        boards[..., 1] *= -1 # Invert Y axis for Excalidraw
+        return [board[:n] for (board, n) in zip(boards, self.layout.board_lengths.tolist())]
+
+    def _points(self, board: Board) -> list[Point]:
+        return list(map(tuple, board.tolist()))
+
     def _create_filename(self, basename: str) -> str:
         if not basename.endswith(".excalidraw"):
             basename += ".excalidraw"
         return basename
     
     def _render_board_dimensions(self, xd: DiagramBuilder, board: Board) -> None:
-        for i in range(len(board) - 1):
-            a = board[i]
-            b = board[i + 1]
-            length = math.hypot(b[0] - a[0], b[1] - a[1])
-            normal_vector = ((b[1] - a[1]) / length, -(b[0] - a[0]) / length)
-            mid_point = ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
-
-            multiplier = -1.0 if self._is_border_line(a, b) else 1.0
-            x = mid_point[0] + normal_vector[0] * multiplier * 25
-            y = mid_point[1] + normal_vector[1] * multiplier * 25
-
+        starts = board[:-1]
+        ends = board[1:]
+        # Edges collapsed to a single point have no direction to place a label along
+        is_edge = np.any(starts != ends, axis=1)
+        starts = starts[is_edge]
+        ends = ends[is_edge]
+        diffs = ends - starts
+        lengths = np.hypot(diffs[:, 0], diffs[:, 1])
+        normal_vectors = np.stack([diffs[:, 1], -diffs[:, 0]], axis=1) / lengths[:, np.newaxis]
+        mid_points = (starts + ends) / 2
+
+        # Border lines run along a frame side, so both of their points lie exactly on it
+        hw = self.layout.width / 2
+        hh = self.layout.height / 2
+        on_vertical_side = (np.abs(starts[:, 0]) == hw) & (ends[:, 0] == starts[:, 0])
+        on_horizontal_side = (np.abs(starts[:, 1]) == hh) & (ends[:, 1] == starts[:, 1])
+        is_border = on_vertical_side | on_horizontal_side
+        multipliers = np.where(is_border, -1.0, 1.0)
+        label_points = mid_points + normal_vectors * (multipliers * 25)[:, np.newaxis]
+
+        for (length, (x, y)) in zip(lengths.tolist(), label_points.tolist()):
             xd.text().content(self._format_dimension(length)).center(x, y).color("blue")
 
     def _format_dimension(self, value: float) -> str:
         return f"{value:.1f}"
     
-    def _is_border_line(self, a: Point, b: Point) -> bool:
-        return (math.isclose(a[0], b[0]) or math.isclose(a[1], b[1]))
-    
+    def _sorted_offsets(self, offsets: np.ndarray) -> list[list[float]]:
+        return offsets[np.argsort(offsets[:, 0])].tolist()
+
     def _render_border_offsets(self, xd: DiagramBuilder) -> None:
-        offsets = sorted(self.layout.top_offsets)
+        hw = self.layout.width / 2
+        hh = self.layout.height / 2
+
+        offsets = self._sorted_offsets(self.layout.top_offsets)
         increment = 0
+        y = -hh - 5
         for (x1, x2) in offsets:
-            y = -self.layout.height / 2 - 5
             y1 = y - 30 - increment
             xd.line().points([(x1, y), (x1, y1)]).color("green")
             xd.text().content(self._format_dimension(x2)).color("green").anchor(x1 - 3, y1, 'right', 'top')
             increment += 30
 
-        offsets = sorted(self.layout.bottom_offsets)
+        offsets = self._sorted_offsets(self.layout.bottom_offsets)
         increment = 0
+        y = hh + 5
         for (x1, x2) in offsets:
-            y = self.layout.height / 2 + 5
             y1 = y + 30 + increment
             xd.line().points([(x1, y), (x1, y1)]).color("green")
             xd.text().content(self._format_dimension(x2)).color("green").anchor(x1 - 3, y1, 'right', 'bottom')
             increment += 30
 
-        offsets = sorted(self.layout.left_offsets)
+        offsets = self._sorted_offsets(self.layout.left_offsets)
         increment = 0
+        x = -hw - 5
         for (y1, y2) in offsets:
-            x = -self.layout.width / 2 - 5
             x1 = x - 50 - increment
             xd.line().points([(x, -y1), (x1, -y1)]).color("green")
             xd.text().content(self._format_dimension(y2)).color("green").anchor(x1, -y1, 'left', 'top')
             increment += 60
 
-        offsets = sorted(self.layout.right_offsets)
+        offsets = self._sorted_offsets(self.layout.right_offsets)
         increment = 0
+        x = hw + 5
         for (y1, y2) in offsets:
-            x = self.layout.width / 2 + 5
             x1 = x + 50 + increment
             xd.line().points([(x, -y1), (x1, -y1)]).color("green")
             xd.text().content(self._format_dimension(y2)).color("green").anchor(x1, -y1, 'right', 'top')
@@ -0,0 +1,42 @@
+""" Regression checks for the board layout geometry"""
+
+import math
+
+import numpy as np
+import pytest
+
+from main import EvenLayout, OddLayout
+
+def _sorted_boards(layout) -> list:
+    return sorted(tuple(map(tuple, np.round(board, 9).tolist())) for board in layout.boards)
+
+@pytest.mark.parametrize("layout_class", [EvenLayout, OddLayout])
+@pytest.mark.parametrize(("angle", "same_lines_angle"), [(-45, 135), (225, 45)])
+def test_angles_with_negative_sine_match_their_supplement(layout_class, angle, same_lines_angle):
+    """ Angles 180 degrees apart describe the same board lines, also when sin(angle) is negative"""
+    layout = layout_class(600, 400, 140, angle, 4).calculate()
+    expected = layout_class(600, 400, 140, same_lines_angle, 4).calculate()
+    assert _sorted_boards(layout) == _sorted_boards(expected)
+    for side in ("top_offsets", "bottom_offsets", "left_offsets", "right_offsets"):
+        assert np.allclose(np.sort(getattr(layout, side), axis=0), np.sort(getattr(expected, side), axis=0))
+
+def _count_points_near(layout, axis: int, value: float) -> int:
+    return sum(math.isclose(point[axis], value) for board in layout.boards for point in board)
+
+@pytest.mark.parametrize(("size", "board_width"), [(220, 110), (100, 50)])
+def test_lines_through_frame_corners_emit_no_repeated_points(size, board_width):
+    """ An intersection rounding onto a frame corner is not emitted a second time next to the corner"""
+    layout = EvenLayout(size, size, board_width, 45, 0).calculate()
+    for board in layout.boards:
+        points = [tuple(point) for point in board]
+        assert all(a != b for (a, b) in zip(points, points[1:] + points[:1]))
+
+@pytest.mark.parametrize(("size", "board_width"), [(220, 110), (100, 50)])
+def test_lines_through_frame_corners_keep_their_edge_offsets(size, board_width):
+    """ Every board point within rounding error of a frame side gets an offset on that side"""
+    layout = EvenLayout(size, size, board_width, 45, 0).calculate()
+    (hw, hh) = (size / 2, size / 2)
+    assert len(layout.bottom_offsets) == _count_points_near(layout, 1, -hh)
+    assert len(layout.top_offsets) == _count_points_near(layout, 1, hh)
+    assert len(layout.left_offsets) == _count_points_near(layout, 0, -hw)
+    assert len(layout.right_offsets) == _count_points_near(layout, 0, hw)